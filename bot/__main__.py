@@ -78,6 +78,25 @@ add_aria2_callbacks()
 create_help_buttons()
 add_handlers()
 
+from .custom.settings_db import (
+    DB_OPTIMIZE_INTERVAL,
+    TOKEN_REAP_INTERVAL,
+    WAL_CHECKPOINT_INTERVAL,
+    checkpoint_db,
+    reap_expired_tokens,
+)
+from .helper.ext_utils.bot_utils import SetInterval, sync_to_async
+
+token_reaper = SetInterval(
+    TOKEN_REAP_INTERVAL, lambda: sync_to_async(reap_expired_tokens)
+)
+db_checkpointer = SetInterval(
+    WAL_CHECKPOINT_INTERVAL, lambda: sync_to_async(checkpoint_db)
+)
+db_optimizer = SetInterval(
+    DB_OPTIMIZE_INTERVAL, lambda: sync_to_async(checkpoint_db, True)
+)
+
 from .core.plugin_manager import get_plugin_manager
 from .modules.plugin_manager import register_plugin_commands
 
@@ -1,8 +1,11 @@
 ﻿from __future__ import annotations
 
+import re
 import sqlite3
+import threading
 import time
 import secrets
+from logging import getLogger
 from pathlib import Path
 
 DEFAULT_SETTINGS = {
@@ -13,148 +16,306 @@ DEFAULT_SETTINGS = {
 
 DB_PATH = Path(__file__).resolve().parent.parent / "settings.db"
 
+LOGGER = getLogger(__name__)
+
+# Expired verify/premium tokens are kept for a day so late redeem attempts
+# still get an "expired" reply, then removed by reap_expired_tokens, which
+# __main__ runs every TOKEN_REAP_INTERVAL seconds through SetInterval.
+TOKEN_REAP_INTERVAL = 600
+TOKEN_REAP_GRACE = 86400
+# checkpoint_db is scheduled on this interval so writers rarely pay for a
+# checkpoint inline; the high wal_autocheckpoint is only a backstop.
+WAL_CHECKPOINT_INTERVAL = 60
+DB_OPTIMIZE_INTERVAL = 3600
+
+# Short-lived read caches so chatty handlers don't hit SQLite per message.
+SETTINGS_CACHE_TTL = 30
+SETTINGS_CACHE_SIZE = 2048
+_SETTINGS_CACHE: dict[int, tuple[float, dict]] = {}
+_LIMITS_CACHE: dict[int, tuple[float, dict]] = {}
+_GLOBAL_CACHE: dict[str, tuple[float, str]] = {}
+_ADMIN_CACHE: dict[str, tuple[float, frozenset[int]]] = {}
+
+_CONN: sqlite3.Connection | None = None
+_CONN_LOCK = threading.RLock()
+
+_LIMIT_DEFAULTS = {
+    "is_premium": 0,
+    "premium_expire_ts": 0,
+    "daily_task_count": 0,
+    "last_task_date": "",
+    "is_verified": 0,
+    "verification_fail_count": 0,
+    "verification_blocked": 0,
+    "is_banned": 0,
+}
 
-def _ensure_db() -> None:
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS user_limits (
-                user_id INTEGER PRIMARY KEY,
-                is_premium INTEGER,
-                premium_expire_ts INTEGER,
-                daily_task_count INTEGER,
-                last_task_date TEXT,
-                is_verified INTEGER,
-                verification_fail_count INTEGER,
-                verification_blocked INTEGER,
-                is_banned INTEGER
-            )
-            """
+# Fixed SQL strings so sqlite3's statement cache reuses the compiled plans.
+_SQL_GET_LIMITS = """
+    SELECT is_premium, premium_expire_ts, daily_task_count, last_task_date,
+           is_verified, verification_fail_count, verification_blocked, is_banned
+    FROM user_limits WHERE user_id = ?
+"""
+_SQL_UPSERT_LIMITS = """
+    INSERT INTO user_limits (
+        user_id, is_premium, premium_expire_ts, daily_task_count, last_task_date,
+        is_verified, verification_fail_count, verification_blocked, is_banned
+    ) VALUES (
+        :user_id, :is_premium, :premium_expire_ts, :daily_task_count, :last_task_date,
+        :is_verified, :verification_fail_count, :verification_blocked, :is_banned
+    )
+    ON CONFLICT(user_id) DO UPDATE SET
+        is_premium = excluded.is_premium,
+        premium_expire_ts = excluded.premium_expire_ts,
+        daily_task_count = excluded.daily_task_count,
+        last_task_date = excluded.last_task_date,
+        is_verified = excluded.is_verified,
+        verification_fail_count = excluded.verification_fail_count,
+        verification_blocked = excluded.verification_blocked,
+        is_banned = excluded.is_banned
+"""
+_SQL_INC_DAILY = """
+    INSERT INTO user_limits (
+        user_id, is_premium, premium_expire_ts, daily_task_count, last_task_date,
+        is_verified, verification_fail_count, verification_blocked, is_banned
+    ) VALUES (?, 0, 0, 1, ?, 0, 0, 0, 0)
+    ON CONFLICT(user_id) DO UPDATE SET
+        daily_task_count = CASE
+            WHEN last_task_date = excluded.last_task_date
+            THEN COALESCE(daily_task_count, 0) + 1
+            ELSE 1
+        END,
+        last_task_date = excluded.last_task_date
+    RETURNING daily_task_count
+"""
+# Failed verifications before a user is blocked
+VERIFY_STRIKE_LIMIT = 3
+_SQL_VERIFY_STRIKE = """
+    INSERT INTO user_limits (
+        user_id, is_premium, premium_expire_ts, daily_task_count, last_task_date,
+        is_verified, verification_fail_count, verification_blocked, is_banned
+    ) VALUES (:user_id, 0, 0, 0, '', 0, 1, 1 >= :max_strikes, 0)
+    ON CONFLICT(user_id) DO UPDATE SET
+        verification_fail_count = COALESCE(verification_fail_count, 0) + 1,
+        verification_blocked = COALESCE(verification_fail_count, 0) + 1 >= :max_strikes
+    RETURNING verification_fail_count, verification_blocked
+"""
+# Adds time on top of an unexpired premium, otherwise starts from now
+_SQL_EXTEND_PREMIUM = """
+    INSERT INTO user_limits (
+        user_id, is_premium, premium_expire_ts, daily_task_count, last_task_date,
+        is_verified, verification_fail_count, verification_blocked, is_banned
+    ) VALUES (:user_id, 1, :now + :seconds, 0, '', 0, 0, 0, 0)
+    ON CONFLICT(user_id) DO UPDATE SET
+        is_premium = 1,
+        premium_expire_ts = MAX(:now, COALESCE(premium_expire_ts, 0)) + :seconds
+    RETURNING premium_expire_ts
+"""
+# "<chat_id>" or "<chat_id>/<topic_id>"
+_CHAT_TARGET_RE = re.compile(r"(-?\d+)(?:/(\d+))?")
+
+_PREMIUM_TOKEN_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+# Rows per multi-VALUES insert; keeps bound parameters under SQLite's limit.
+_PREMIUM_TOKEN_BATCH = 200
+
+_SQL_GET_SETTINGS = (
+    "SELECT chat_id, caption, thumb_path FROM user_settings WHERE user_id = ?"
+)
+
+
+def _get_conn() -> sqlite3.Connection:
+    global _CONN
+    if _CONN is None:
+        with _CONN_LOCK:
+            if _CONN is None:
+                conn = sqlite3.connect(
+                    DB_PATH, check_same_thread=False, cached_statements=256
+                )
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("PRAGMA temp_store=MEMORY")
+                conn.execute("PRAGMA cache_size=-64000")
+                conn.execute("PRAGMA busy_timeout=5000")
+                conn.execute("PRAGMA wal_autocheckpoint=10000")
+                _ensure_db(conn)
+                _CONN = conn
+    return _CONN
+
+
+def _ensure_db(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_limits (
+            user_id INTEGER PRIMARY KEY,
+            is_premium INTEGER,
+            premium_expire_ts INTEGER,
+            daily_task_count INTEGER,
+            last_task_date TEXT,
+            is_verified INTEGER,
+            verification_fail_count INTEGER,
+            verification_blocked INTEGER,
+            is_banned INTEGER
         )
-        # Backfill for existing DBs without premium_expire_ts
-        try:
-            conn.execute("ALTER TABLE user_limits ADD COLUMN premium_expire_ts INTEGER")
-        except sqlite3.OperationalError:
-            pass
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS user_settings (
-                user_id INTEGER PRIMARY KEY,
-                chat_id TEXT,
-                caption TEXT,
-                thumb_path TEXT
-            )
-            """
+        """
+    )
+    # Backfill for existing DBs without premium_expire_ts
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(user_limits)")}
+    if "premium_expire_ts" not in columns:
+        conn.execute("ALTER TABLE user_limits ADD COLUMN premium_expire_ts INTEGER")
+    # Partial indexes keep the premium/banned listings off a full table scan
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_limits_premium
+        ON user_limits(user_id) WHERE is_premium = 1
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_limits_banned
+        ON user_limits(user_id) WHERE is_banned = 1
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_settings (
+            user_id INTEGER PRIMARY KEY,
+            chat_id TEXT,
+            caption TEXT,
+            thumb_path TEXT
         )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS global_settings (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            )
-            """
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS global_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
         )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS verify_status (
-                user_id INTEGER PRIMARY KEY,
-                verify_status_ts INTEGER
-            )
-            """
+        """
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS admins (user_id INTEGER PRIMARY KEY)")
+    # Move the legacy admin_user_ids CSV setting into the admins table
+    row = conn.execute(
+        "SELECT value FROM global_settings WHERE key = 'admin_user_ids'"
+    ).fetchone()
+    if row:
+        legacy = [
+            (int(part),)
+            for part in (part.strip() for part in (row[0] or "").split(","))
+            if part.lstrip("-").isdigit()
+        ]
+        conn.executemany("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", legacy)
+        conn.execute("DELETE FROM global_settings WHERE key = 'admin_user_ids'")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS verify_status (
+            user_id INTEGER PRIMARY KEY,
+            verify_status_ts INTEGER
         )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS verify_tokens (
-                user_id INTEGER,
-                token TEXT,
-                created_at INTEGER,
-                expire_at INTEGER,
-                PRIMARY KEY (user_id, token)
-            )
-            """
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS verify_tokens (
+            user_id INTEGER,
+            token TEXT,
+            created_at INTEGER,
+            expire_at INTEGER,
+            PRIMARY KEY (user_id, token)
         )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS verify_bans (
-                user_id INTEGER PRIMARY KEY,
-                strikes INTEGER,
-                banned INTEGER
-            )
-            """
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_verify_tokens_expire ON verify_tokens(expire_at)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS verify_bans (
+            user_id INTEGER PRIMARY KEY,
+            strikes INTEGER,
+            banned INTEGER
         )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS premium_tokens (
-                token TEXT PRIMARY KEY,
-                created_at INTEGER,
-                expires_at INTEGER,
-                redeemed_by INTEGER,
-                redeemed_at INTEGER,
-                generated_by INTEGER
-            )
-            """
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS premium_tokens (
+            token TEXT PRIMARY KEY,
+            created_at INTEGER,
+            expires_at INTEGER,
+            redeemed_by INTEGER,
+            redeemed_at INTEGER,
+            generated_by INTEGER
         )
-        conn.commit()
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_premium_tokens_expire ON premium_tokens(expires_at)"
+    )
+    conn.commit()
+
+
+def _cache_get(cache: dict, key):
+    entry = cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _cache_put(cache: dict, key, value) -> None:
+    # Reinsert at the end so the front is always the least recently stored
+    # entry, and a refresh never evicts some other live key.
+    if cache.pop(key, None) is None and len(cache) >= SETTINGS_CACHE_SIZE:
+        cache.pop(next(iter(cache)))
+    cache[key] = (time.monotonic() + SETTINGS_CACHE_TTL, value)
 
 
 def get_settings(user_id: int) -> dict:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
-        row = conn.execute(
-            "SELECT chat_id, caption, thumb_path FROM user_settings WHERE user_id = ?",
-            (user_id,),
-        ).fetchone()
-    settings = dict(DEFAULT_SETTINGS)
-    if row:
-        settings["chat_id"] = row[0] or ""
-        settings["caption"] = row[1] or ""
-        settings["thumb_path"] = row[2] or ""
-    return settings
+    cached = _cache_get(_SETTINGS_CACHE, user_id)
+    if cached is not None:
+        return dict(cached)
+    with _CONN_LOCK, _get_conn() as conn:
+        row = conn.execute(_SQL_GET_SETTINGS, (user_id,)).fetchone()
+        settings = dict(DEFAULT_SETTINGS)
+        if row:
+            settings["chat_id"] = row[0] or ""
+            settings["caption"] = row[1] or ""
+            settings["thumb_path"] = row[2] or ""
+        _cache_put(_SETTINGS_CACHE, user_id, settings)
+    return dict(settings)
 
 
 def _ensure_user_limits(user_id: int) -> dict:
-    _ensure_db()
-    defaults = {
-        "is_premium": 0,
-        "premium_expire_ts": 0,
-        "daily_task_count": 0,
-        "last_task_date": "",
-        "is_verified": 0,
-        "verification_fail_count": 0,
-        "verification_blocked": 0,
-        "is_banned": 0,
-    }
-    with sqlite3.connect(DB_PATH) as conn:
-        row = conn.execute(
-            """
-            SELECT is_premium, premium_expire_ts, daily_task_count, last_task_date,
-                   is_verified, verification_fail_count, verification_blocked, is_banned
-            FROM user_limits WHERE user_id = ?
-            """,
-            (user_id,),
-        ).fetchone()
-        if not row:
-            conn.execute(
-                """
-                INSERT INTO user_limits (
-                    user_id, is_premium, premium_expire_ts, daily_task_count, last_task_date,
-                    is_verified, verification_fail_count, verification_blocked, is_banned
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    user_id,
-                    defaults["is_premium"],
-                    defaults["premium_expire_ts"],
-                    defaults["daily_task_count"],
-                    defaults["last_task_date"],
-                    defaults["is_verified"],
-                    defaults["verification_fail_count"],
-                    defaults["verification_blocked"],
-                    defaults["is_banned"],
-                ),
-            )
-            conn.commit()
-            return dict(defaults)
+    cached = _cache_get(_LIMITS_CACHE, user_id)
+    if cached is not None:
+        return dict(cached)
+    with _CONN_LOCK, _get_conn() as conn:
+        return _read_user_limits(conn, user_id)
+
+
+# The _read/_write helpers run inside the caller's transaction and never commit.
+def _read_user_limits(conn: sqlite3.Connection, user_id: int) -> dict:
+    cached = _cache_get(_LIMITS_CACHE, user_id)
+    if cached is not None:
+        return dict(cached)
+    row = conn.execute(_SQL_GET_LIMITS, (user_id,)).fetchone()
+    if not row:
+        conn.execute(_SQL_UPSERT_LIMITS, {"user_id": user_id, **_LIMIT_DEFAULTS})
+    data = _load_limits_row(row) if row else dict(_LIMIT_DEFAULTS)
+    _cache_put(_LIMITS_CACHE, user_id, data)
+    return dict(data)
+
+
+def _write_user_limits(conn: sqlite3.Connection, user_id: int, updates: dict) -> dict:
+    row = _read_user_limits(conn, user_id)
+    row.update(updates)
+    conn.execute(_SQL_UPSERT_LIMITS, {"user_id": user_id, **row})
+    # Refilled by the caller once the transaction has committed
+    _LIMITS_CACHE.pop(user_id, None)
+    return row
+
+
+def _load_limits_row(row) -> dict:
     return {
         "is_premium": int(row[0] or 0),
         "premium_expire_ts": int(row[1] or 0),
@@ -179,26 +340,13 @@ def get_daily_task_count_snapshot(user_id: int, today: str) -> int:
 
 
 def update_user_limits(user_id: int, **fields) -> None:
-    _ensure_db()
-    _ensure_user_limits(user_id)
-    allowed = {
-        "is_premium",
-        "premium_expire_ts",
-        "daily_task_count",
-        "last_task_date",
-        "is_verified",
-        "verification_fail_count",
-        "verification_blocked",
-        "is_banned",
-    }
-    updates = {k: v for k, v in fields.items() if k in allowed}
+    updates = {k: v for k, v in fields.items() if k in _LIMIT_DEFAULTS}
     if not updates:
         return
-    keys = ", ".join(f"{k} = ?" for k in updates.keys())
-    values = list(updates.values()) + [user_id]
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(f"UPDATE user_limits SET {keys} WHERE user_id = ?", values)
-        conn.commit()
+    with _CONN_LOCK:
+        with _get_conn() as conn:
+            row = _write_user_limits(conn, user_id, updates)
+        _cache_put(_LIMITS_CACHE, user_id, row)
 
 
 def is_premium(user_id: int) -> bool:
@@ -219,15 +367,35 @@ def set_premium(user_id: int, enabled: bool, expire_ts: int = 0) -> None:
         update_user_limits(user_id, is_premium=0, premium_expire_ts=0)
 
 
+def extend_premium(user_id: int, days: int, now: int | None = None) -> int:
+    if now is None:
+        now = int(time.time())
+    params = {"user_id": user_id, "now": now, "seconds": days * 86400}
+    with _CONN_LOCK, _get_conn() as conn:
+        row = conn.execute(_SQL_EXTEND_PREMIUM, params).fetchone()
+        _LIMITS_CACHE.pop(user_id, None)
+    return int(row[0])
+
+
 def list_premium_users() -> list[int]:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
+    with _CONN_LOCK, _get_conn() as conn:
         rows = conn.execute(
             "SELECT user_id FROM user_limits WHERE is_premium = 1"
         ).fetchall()
     return [int(row[0]) for row in rows]
 
 
+def list_premium_users_with_expiry() -> list[tuple[int, int]]:
+    with _CONN_LOCK, _get_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT user_id, premium_expire_ts FROM user_limits
+            WHERE is_premium = 1 ORDER BY user_id
+            """
+        ).fetchall()
+    return [(int(row[0]), int(row[1] or 0)) for row in rows]
+
+
 def get_premium_expire_ts(user_id: int) -> int:
     data = _ensure_user_limits(user_id)
     return int(data.get("premium_expire_ts", 0))
@@ -243,44 +411,50 @@ def set_global_ban(user_id: int, enabled: bool) -> None:
 
 
 def list_banned_users() -> list[int]:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
+    with _CONN_LOCK, _get_conn() as conn:
         rows = conn.execute(
             "SELECT user_id FROM user_limits WHERE is_banned = 1"
         ).fetchall()
     return [int(row[0]) for row in rows]
 
 
+def _new_premium_token() -> str:
+    return "PREM-" + "".join(secrets.choice(_PREMIUM_TOKEN_ALPHABET) for _ in range(6))
+
+
 def create_premium_tokens(qty: int, generated_by: int, ttl_seconds: int = 3600) -> list[str]:
-    _ensure_db()
     now = int(time.time())
+    expires_at = now + ttl_seconds
     tokens: list[str] = []
-    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
-    with sqlite3.connect(DB_PATH) as conn:
-        for _ in range(qty):
-            while True:
-                token = "PREM-" + "".join(secrets.choice(alphabet) for _ in range(6))
-                expires_at = now + ttl_seconds
-                try:
-                    conn.execute(
-                        """
-                        INSERT INTO premium_tokens
-                            (token, created_at, expires_at, redeemed_by, redeemed_at, generated_by)
-                        VALUES (?, ?, ?, NULL, NULL, ?)
-                        """,
-                        (token, now, expires_at, generated_by),
-                    )
-                    tokens.append(token)
-                    break
-                except sqlite3.IntegrityError:
-                    continue
-        conn.commit()
+    with _CONN_LOCK, _get_conn() as conn:
+        # INSERT OR IGNORE drops collisions and RETURNING reports the rows that
+        # landed, so the loop only tops up what was lost.
+        while len(tokens) < qty:
+            batch = {
+                _new_premium_token()
+                for _ in range(min(qty - len(tokens), _PREMIUM_TOKEN_BATCH))
+            }
+            values = ", ".join("(?, ?, ?, NULL, NULL, ?)" for _ in batch)
+            params = [
+                value
+                for token in batch
+                for value in (token, now, expires_at, generated_by)
+            ]
+            rows = conn.execute(
+                f"""
+                INSERT OR IGNORE INTO premium_tokens
+                    (token, created_at, expires_at, redeemed_by, redeemed_at, generated_by)
+                VALUES {values}
+                RETURNING token
+                """,
+                params,
+            ).fetchall()
+            tokens.extend(row[0] for row in rows)
     return tokens
 
 
 def get_premium_token(token: str) -> dict | None:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
+    with _CONN_LOCK, _get_conn() as conn:
         row = conn.execute(
             """
             SELECT token, created_at, expires_at, redeemed_by, redeemed_at, generated_by
@@ -301,10 +475,9 @@ def get_premium_token(token: str) -> dict | None:
 
 
 def mark_premium_token_redeemed(token: str, user_id: int, redeemed_at: int | None = None) -> None:
-    _ensure_db()
     if redeemed_at is None:
         redeemed_at = int(time.time())
-    with sqlite3.connect(DB_PATH) as conn:
+    with _CONN_LOCK, _get_conn() as conn:
         conn.execute(
             """
             UPDATE premium_tokens
@@ -313,7 +486,6 @@ def mark_premium_token_redeemed(token: str, user_id: int, redeemed_at: int | Non
             """,
             (user_id, redeemed_at, token),
         )
-        conn.commit()
 
 
 def get_daily_task_count(user_id: int, today: str) -> int:
@@ -325,60 +497,90 @@ def get_daily_task_count(user_id: int, today: str) -> int:
 
 
 def increment_daily_task_count(user_id: int, today: str) -> int:
-    count = get_daily_task_count(user_id, today)
-    count += 1
-    update_user_limits(user_id, daily_task_count=count, last_task_date=today)
-    return count
+    with _CONN_LOCK, _get_conn() as conn:
+        row = conn.execute(_SQL_INC_DAILY, (user_id, today)).fetchone()
+        _LIMITS_CACHE.pop(user_id, None)
+    return int(row[0])
 
 
 def save_settings(user_id: int, settings: dict) -> None:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            """
-            INSERT INTO user_settings (user_id, chat_id, caption, thumb_path)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                chat_id = excluded.chat_id,
-                caption = excluded.caption,
-                thumb_path = excluded.thumb_path
-            """,
-            (
-                user_id,
-                settings.get("chat_id", ""),
-                settings.get("caption", ""),
-                settings.get("thumb_path", ""),
-            ),
-        )
-        conn.commit()
+    with _CONN_LOCK:
+        # Repeated taps resave identical values; skip the write for those
+        cached = _cache_get(_SETTINGS_CACHE, user_id)
+        if cached is not None and all(
+            settings.get(key, "") == cached[key] for key in DEFAULT_SETTINGS
+        ):
+            return
+        with _get_conn() as conn:
+            conn.execute(
+                """
+                INSERT INTO user_settings (user_id, chat_id, caption, thumb_path)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    chat_id = excluded.chat_id,
+                    caption = excluded.caption,
+                    thumb_path = excluded.thumb_path
+                """,
+                (
+                    user_id,
+                    settings.get("chat_id", ""),
+                    settings.get("caption", ""),
+                    settings.get("thumb_path", ""),
+                ),
+            )
+            _SETTINGS_CACHE.pop(user_id, None)
 
 
 def parse_chat_target(value: str) -> tuple[int | None, int | None]:
     if not value:
         return None, None
-    if "/" in value:
-        chat_id_str, topic_id_str = value.split("/", 1)
-        if chat_id_str.lstrip("-").isdigit() and topic_id_str.isdigit():
-            return int(chat_id_str), int(topic_id_str)
+    match = _CHAT_TARGET_RE.fullmatch(value)
+    if not match:
         return None, None
-    if value.lstrip("-").isdigit():
-        return int(value), None
-    return None, None
+    chat_id, topic_id = match.groups()
+    return int(chat_id), int(topic_id) if topic_id else None
 
 
 def get_global_setting(key: str) -> str:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
+    cached = _cache_get(_GLOBAL_CACHE, key)
+    if cached is not None:
+        return cached
+    with _CONN_LOCK, _get_conn() as conn:
         row = conn.execute(
             "SELECT value FROM global_settings WHERE key = ?",
             (key,),
         ).fetchone()
-    return row[0] if row else ""
+        value = (row[0] or "") if row else ""
+        _cache_put(_GLOBAL_CACHE, key, value)
+    return value
+
+
+def get_global_settings(keys: list[str]) -> dict[str, str]:
+    values = {}
+    missing = []
+    for key in keys:
+        cached = _cache_get(_GLOBAL_CACHE, key)
+        if cached is None:
+            missing.append(key)
+        else:
+            values[key] = cached
+    if not missing:
+        return values
+    placeholders = ", ".join("?" for _ in missing)
+    with _CONN_LOCK, _get_conn() as conn:
+        rows = conn.execute(
+            f"SELECT key, value FROM global_settings WHERE key IN ({placeholders})",
+            missing,
+        ).fetchall()
+        stored = {row[0]: row[1] or "" for row in rows}
+        for key in missing:
+            values[key] = stored.get(key, "")
+            _cache_put(_GLOBAL_CACHE, key, values[key])
+    return values
 
 
 def set_global_setting(key: str, value: str) -> None:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
+    with _CONN_LOCK, _get_conn() as conn:
         conn.execute(
             """
             INSERT INTO global_settings (key, value)
@@ -387,37 +589,40 @@ def set_global_setting(key: str, value: str) -> None:
             """,
             (key, value),
         )
-        conn.commit()
+        _GLOBAL_CACHE.pop(key, None)
 
 
 def get_admin_ids() -> set[int]:
-    raw = get_global_setting("admin_user_ids")
-    ids = set()
-    for part in (raw or "").split(","):
-        part = part.strip()
-        if part.lstrip("-").isdigit():
-            ids.add(int(part))
-    return ids
+    ids = _cache_get(_ADMIN_CACHE, "admins")
+    if ids is None:
+        with _CONN_LOCK, _get_conn() as conn:
+            rows = conn.execute("SELECT user_id FROM admins").fetchall()
+            ids = frozenset(row[0] for row in rows)
+            _cache_put(_ADMIN_CACHE, "admins", ids)
+    return set(ids)
 
 
 def add_admin_id(user_id: int) -> None:
-    admins = get_admin_ids()
-    admins.add(user_id)
-    set_global_setting("admin_user_ids", ",".join(str(x) for x in sorted(admins)))
+    if user_id in get_admin_ids():
+        return
+    with _CONN_LOCK, _get_conn() as conn:
+        conn.execute("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (user_id,))
+        _ADMIN_CACHE.pop("admins", None)
 
 
 def remove_admin_id(user_id: int) -> None:
-    admins = get_admin_ids()
-    admins.discard(user_id)
-    set_global_setting("admin_user_ids", ",".join(str(x) for x in sorted(admins)))
+    if user_id not in get_admin_ids():
+        return
+    with _CONN_LOCK, _get_conn() as conn:
+        conn.execute("DELETE FROM admins WHERE user_id = ?", (user_id,))
+        _ADMIN_CACHE.pop("admins", None)
 
 
 def create_verify_token(user_id: int, ttl: int) -> dict:
-    _ensure_db()
     token = secrets.token_urlsafe(10)
     now = int(time.time())
     expire_at = now + max(int(ttl or 0), 0)
-    with sqlite3.connect(DB_PATH) as conn:
+    with _CONN_LOCK, _get_conn() as conn:
         conn.execute(
             """
             INSERT OR REPLACE INTO verify_tokens (user_id, token, created_at, expire_at)
@@ -425,13 +630,11 @@ def create_verify_token(user_id: int, ttl: int) -> dict:
             """,
             (user_id, token, now, expire_at),
         )
-        conn.commit()
     return {"token": token, "created_at": now, "expire_at": expire_at}
 
 
 def get_verify_token(user_id: int, token: str) -> dict | None:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
+    with _CONN_LOCK, _get_conn() as conn:
         row = conn.execute(
             """
             SELECT token, created_at, expire_at
@@ -446,41 +649,36 @@ def get_verify_token(user_id: int, token: str) -> dict | None:
 
 
 def delete_verify_token(user_id: int, token: str) -> None:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
+    with _CONN_LOCK, _get_conn() as conn:
         conn.execute(
             "DELETE FROM verify_tokens WHERE user_id = ? AND token = ?",
             (user_id, token),
         )
-        conn.commit()
 
 
 def clear_verify_tokens(user_id: int) -> None:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
+    with _CONN_LOCK, _get_conn() as conn:
         conn.execute("DELETE FROM verify_tokens WHERE user_id = ?", (user_id,))
-        conn.commit()
 
 
 def set_verify_status(user_id: int, ts: int | None = None) -> None:
-    _ensure_db()
     ts = int(ts or time.time())
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            """
-            INSERT INTO verify_status (user_id, verify_status_ts)
-            VALUES (?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET verify_status_ts = excluded.verify_status_ts
-            """,
-            (user_id, ts),
-        )
-        conn.commit()
-    update_user_limits(user_id, is_verified=1)
+    with _CONN_LOCK:
+        with _get_conn() as conn:
+            conn.execute(
+                """
+                INSERT INTO verify_status (user_id, verify_status_ts)
+                VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET verify_status_ts = excluded.verify_status_ts
+                """,
+                (user_id, ts),
+            )
+            row = _write_user_limits(conn, user_id, {"is_verified": 1})
+        _cache_put(_LIMITS_CACHE, user_id, row)
 
 
 def get_verify_status(user_id: int) -> int | None:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
+    with _CONN_LOCK, _get_conn() as conn:
         row = conn.execute(
             "SELECT verify_status_ts FROM verify_status WHERE user_id = ?",
             (user_id,),
@@ -489,24 +687,19 @@ def get_verify_status(user_id: int) -> int | None:
 
 
 def clear_verify_status(user_id: int) -> None:
-    _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("DELETE FROM verify_status WHERE user_id = ?", (user_id,))
-        conn.commit()
-    update_user_limits(user_id, is_verified=0)
+    with _CONN_LOCK:
+        with _get_conn() as conn:
+            conn.execute("DELETE FROM verify_status WHERE user_id = ?", (user_id,))
+            row = _write_user_limits(conn, user_id, {"is_verified": 0})
+        _cache_put(_LIMITS_CACHE, user_id, row)
 
 
 def record_verify_strike(user_id: int) -> tuple[int, bool]:
-    _ensure_db()
-    data = _ensure_user_limits(user_id)
-    strikes = int(data.get("verification_fail_count", 0)) + 1
-    banned = 1 if strikes >= 3 else 0
-    update_user_limits(
-        user_id,
-        verification_fail_count=strikes,
-        verification_blocked=banned,
-    )
-    return strikes, bool(banned)
+    params = {"user_id": user_id, "max_strikes": VERIFY_STRIKE_LIMIT}
+    with _CONN_LOCK, _get_conn() as conn:
+        strikes, banned = conn.execute(_SQL_VERIFY_STRIKE, params).fetchone()
+        _LIMITS_CACHE.pop(user_id, None)
+    return int(strikes), bool(banned)
 
 
 def clear_verify_strikes(user_id: int) -> None:
@@ -516,3 +709,35 @@ def clear_verify_strikes(user_id: int) -> None:
 def is_user_banned(user_id: int) -> bool:
     data = _ensure_user_limits(user_id)
     return bool(int(data.get("verification_blocked", 0)))
+
+
+def reap_expired_tokens(now: int | None = None) -> int:
+    cutoff = int(now or time.time()) - TOKEN_REAP_GRACE
+    try:
+        with _CONN_LOCK, _get_conn() as conn:
+            removed = conn.execute(
+                "DELETE FROM verify_tokens WHERE expire_at < ?", (cutoff,)
+            ).rowcount
+            # Redeemed tokens are the premium grant history; keep them.
+            removed += conn.execute(
+                "DELETE FROM premium_tokens"
+                " WHERE expires_at < ? AND redeemed_by IS NULL",
+                (cutoff,),
+            ).rowcount
+    except Exception:
+        LOGGER.exception("Reaping expired tokens failed")
+        return 0
+    if removed:
+        LOGGER.info(f"Removed {removed} expired tokens from settings db")
+    return removed
+
+
+def checkpoint_db(optimize: bool = False) -> None:
+    try:
+        with _CONN_LOCK:
+            conn = _get_conn()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            if optimize:
+                conn.execute("PRAGMA optimize")
+    except Exception:
+        LOGGER.exception("Settings db checkpoint failed")
@@ -10,9 +10,10 @@ from pyrogram.handlers import CallbackQueryHandler, MessageHandler
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 from bot.core.config_manager import Config
+from bot.helper.ext_utils.bot_utils import sync_to_async
 from .settings_db import (
     get_admin_ids,
-    get_global_setting,
+    get_global_settings,
     get_settings,
     save_settings,
     set_global_setting,
@@ -44,6 +45,8 @@ BSETTING_KEYS = [
     "PAYMENT_QR",
     "WARNING_CHANNEL",
 ]
+# Membership checks in bsettings_callback; the list keeps menu order
+_BSETTING_KEY_SET = frozenset(BSETTING_KEYS)
 
 
 def _parse_id_list(value: str) -> set[int]:
@@ -107,10 +110,8 @@ def _is_admin(user_id: int) -> bool:
     return False
 
 
-def _get_verif_value(key: str) -> str:
-    raw = (get_global_setting(key) or "").strip()
-    if raw:
-        return raw
+def _get_verif_values(keys: list[str]) -> dict[str, str]:
+    stored = get_global_settings(keys)
     defaults = {
         "VERIFY_EXPIRE": str(VERIFY_EXPIRE),
         "TOKEN_TTL": str(TOKEN_TTL),
@@ -121,7 +122,9 @@ def _get_verif_value(key: str) -> str:
         "SHORTLINK_API": SHORTLINK_API,
         "SUPPORT_ID": "",
     }
-    return defaults.get(key, "")
+    return {
+        key: (stored.get(key) or "").strip() or defaults.get(key, "") for key in keys
+    }
 
 
 def _format_bsetting_text() -> str:
@@ -133,8 +136,9 @@ def _format_bsetting_text() -> str:
         return f"<code>{value}</code>"
 
     lines = ["≡ƒº⌐ <b>Verification Settings</b>", ""]
+    values = _get_verif_values(BSETTING_KEYS)
     for key in BSETTING_KEYS:
-        value = _get_verif_value(key)
+        value = values[key]
         lines.append(f"ΓÇó <b>{key}</b>: {fmt_value(key, value)}")
     lines.append("")
     lines.append("Tap a key to set. Send <code>clear</code> to unset.")
@@ -176,11 +180,39 @@ def _bsetting_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
+# Both menus are static, so build them once instead of on every render
+_SETTINGS_KB = _keyboard()
+_BSETTING_KB = _bsetting_keyboard()
+
+
+# settings:<action> -> (pending input key, prompt)
+_SETTINGS_PROMPTS = {
+    "setchat": (
+        "chat_id",
+        (
+            "≡ƒô¿ <b>Send the chat ID</b> (with -100 prefix).\n"
+            "For topics: <code>-100CHATID/TOPIC_ID</code>"
+        ),
+    ),
+    "setcaption": (
+        "caption",
+        (
+            "≡ƒô¥ <b>Send caption template</b>\n"
+            "You can use <code>{filename}</code>, <code>{basename}</code>, <code>{ext}</code>."
+        ),
+    ),
+    "setthumb": (
+        "thumb",
+        "≡ƒû╝∩╕Å <b>Send the photo</b> you want to set as thumbnail.",
+    ),
+}
+
+
 async def send_settings_message(message, user_id: int) -> None:
-    settings = get_settings(user_id)
+    settings = await sync_to_async(get_settings, user_id)
     await message.reply_text(
         _format_settings_text(settings),
-        reply_markup=_keyboard(),
+        reply_markup=_SETTINGS_KB,
         parse_mode=ParseMode.HTML,
     )
 
@@ -190,13 +222,13 @@ async def settings_command(_, message):
 
 
 async def bsettings_command(_, message):
-    if not _is_admin(message.from_user.id):
+    if not await sync_to_async(_is_admin, message.from_user.id):
         return await message.reply_text(
             "Γ¢ö <b>Unauthorized</b>", parse_mode=ParseMode.HTML
         )
     await message.reply_text(
-        _format_bsetting_text(),
-        reply_markup=_bsetting_keyboard(),
+        await sync_to_async(_format_bsetting_text),
+        reply_markup=_BSETTING_KB,
         parse_mode=ParseMode.HTML,
     )
 
@@ -207,46 +239,25 @@ async def settings_callback(_, cq):
     if not data.startswith("settings:"):
         return
 
-    settings = get_settings(user_id)
     action = data.split(":", 1)[1]
 
-    if action == "setchat":
-        PENDING_INPUT[user_id] = PendingInput(key="chat_id", message_id=cq.message.id)
-        await cq.message.reply_text(
-            "≡ƒô¿ <b>Send the chat ID</b> (with -100 prefix).\n"
-            "For topics: <code>-100CHATID/TOPIC_ID</code>",
-            parse_mode=ParseMode.HTML,
-        )
+    if prompt := _SETTINGS_PROMPTS.get(action):
+        key, text = prompt
+        PENDING_INPUT[user_id] = PendingInput(key=key, message_id=cq.message.id)
+        await cq.message.reply_text(text, parse_mode=ParseMode.HTML)
         await cq.answer()
         return
 
-    if action == "setcaption":
-        PENDING_INPUT[user_id] = PendingInput(key="caption", message_id=cq.message.id)
-        await cq.message.reply_text(
-            "≡ƒô¥ <b>Send caption template</b>\n"
-            "You can use <code>{filename}</code>, <code>{basename}</code>, <code>{ext}</code>.",
-            parse_mode=ParseMode.HTML,
-        )
-        await cq.answer()
-        return
-
-    if action == "setthumb":
-        PENDING_INPUT[user_id] = PendingInput(key="thumb", message_id=cq.message.id)
-        await cq.message.reply_text(
-            "≡ƒû╝∩╕Å <b>Send the photo</b> you want to set as thumbnail.",
-            parse_mode=ParseMode.HTML,
-        )
-        await cq.answer()
-        return
+    settings = await sync_to_async(get_settings, user_id)
 
     if action == "remthumb":
         if settings.get("thumb_path") and os.path.exists(settings["thumb_path"]):
             os.remove(settings["thumb_path"])
         settings["thumb_path"] = ""
-        save_settings(user_id, settings)
+        await sync_to_async(save_settings, user_id, settings)
         await cq.message.edit_text(
             _format_settings_text(settings),
-            reply_markup=_keyboard(),
+            reply_markup=_SETTINGS_KB,
             parse_mode=ParseMode.HTML,
         )
         await cq.answer()
@@ -258,10 +269,10 @@ async def settings_callback(_, cq):
         if settings.get("thumb_path") and os.path.exists(settings["thumb_path"]):
             os.remove(settings["thumb_path"])
         settings["thumb_path"] = ""
-        save_settings(user_id, settings)
+        await sync_to_async(save_settings, user_id, settings)
         await cq.message.edit_text(
             _format_settings_text(settings),
-            reply_markup=_keyboard(),
+            reply_markup=_SETTINGS_KB,
             parse_mode=ParseMode.HTML,
         )
         await cq.answer()
@@ -280,7 +291,7 @@ async def bsettings_callback(_, cq):
     data = cq.data or ""
     if not data.startswith("bsetting:"):
         return
-    if not _is_admin(user_id):
+    if not await sync_to_async(_is_admin, user_id):
         await cq.answer("Unauthorized", show_alert=True)
         return
 
@@ -290,7 +301,7 @@ async def bsettings_callback(_, cq):
         await cq.answer()
         return
 
-    if action in BSETTING_KEYS:
+    if action in _BSETTING_KEY_SET:
         BSETTING_PENDING[user_id] = PendingInput(key=action, message_id=cq.message.id)
         await cq.message.reply_text(
             f"≡ƒº⌐ <b>Send value for {action}</b>\nType <code>clear</code> to unset.",
@@ -309,23 +320,22 @@ async def settings_input_handler(_, message):
         key = pending_b.key
         value = (message.text or "").strip()
         if value.lower() in {"clear", "unset", "remove", "none"}:
-            set_global_setting(key, "")
+            await sync_to_async(set_global_setting, key, "")
             await message.reply_text(
                 f"≡ƒº╣ <b>{key} cleared.</b>", parse_mode=ParseMode.HTML
             )
         else:
-            set_global_setting(key, value)
+            await sync_to_async(set_global_setting, key, value)
             await message.reply_text(
                 f"Γ£à <b>{key} updated.</b>", parse_mode=ParseMode.HTML
             )
         BSETTING_PENDING.pop(user_id, None)
         try:
-            settings_message = await message._client.get_messages(
-                message.chat.id, pending_b.message_id
-            )
-            await settings_message.edit_text(
-                _format_bsetting_text(),
-                reply_markup=_bsetting_keyboard(),
+            await message._client.edit_message_text(
+                message.chat.id,
+                pending_b.message_id,
+                await sync_to_async(_format_bsetting_text),
+                reply_markup=_BSETTING_KB,
                 parse_mode=ParseMode.HTML,
             )
         except Exception:
@@ -336,16 +346,16 @@ async def settings_input_handler(_, message):
     if not pending:
         return
 
-    settings = get_settings(user_id)
+    settings = await sync_to_async(get_settings, user_id)
     if pending.key == "chat_id":
         settings["chat_id"] = (message.text or "").strip()
-        save_settings(user_id, settings)
+        await sync_to_async(save_settings, user_id, settings)
         await message.reply_text(
             "Γ£à <b>Chat ID set successfully.</b>", parse_mode=ParseMode.HTML
         )
     elif pending.key == "caption":
         settings["caption"] = message.text or ""
-        save_settings(user_id, settings)
+        await sync_to_async(save_settings, user_id, settings)
         await message.reply_text(
             "Γ£à <b>Caption set successfully.</b>", parse_mode=ParseMode.HTML
         )
@@ -356,24 +366,21 @@ async def settings_input_handler(_, message):
             )
             return
         thumb_path = THUMB_DIR / f"{user_id}.jpg"
-        temp = await message.download()
-        if thumb_path.exists():
-            thumb_path.unlink()
-        os.replace(temp, thumb_path)
+        # Absolute, since pyrogram resolves relative names under its own workdir
+        await message.download(file_name=str(thumb_path.resolve()))
         settings["thumb_path"] = str(thumb_path)
-        save_settings(user_id, settings)
+        await sync_to_async(save_settings, user_id, settings)
         await message.reply_text(
             "Γ£à <b>Thumbnail saved successfully.</b>", parse_mode=ParseMode.HTML
         )
 
     PENDING_INPUT.pop(user_id, None)
     try:
-        settings_message = await message._client.get_messages(
-            message.chat.id, pending.message_id
-        )
-        await settings_message.edit_text(
+        await message._client.edit_message_text(
+            message.chat.id,
+            pending.message_id,
             _format_settings_text(settings),
-            reply_markup=_keyboard(),
+            reply_markup=_SETTINGS_KB,
             parse_mode=ParseMode.HTML,
         )
     except Exception:
@@ -29,6 +29,8 @@ class AsyncMega:
             async def wrapper(*args, **kwargs):
                 return await self.run(attr, *args, **kwargs)
 
+            # Later lookups hit the instance dict and skip __getattr__
+            self.__dict__[name] = wrapper
             return wrapper
         return attr
 
@@ -629,7 +629,7 @@ class TelegramUploader:
                 and await aiopath.exists(thumb)
             ):
                 await remove(thumb)
-            return await self._upload_file(cap_mono, file, o_path)
+            return await self._upload_file(cap_mono, file, o_path, force_document)
         except Exception as err:
             if (
                 self._thumb is None
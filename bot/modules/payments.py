@@ -1,24 +1,28 @@
 from __future__ import annotations
 
+from asyncio import gather
 from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
 from time import time
 from urllib.parse import quote_plus
 
 from pyrogram.handlers import MessageHandler, CallbackQueryHandler
 from pyrogram import filters
+from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 from .. import LOGGER
 from ..core.config_manager import Config
 from ..core.tg_client import TgClient
+from ..helper.ext_utils.bot_utils import sync_to_async
 from ..helper.telegram_helper.bot_commands import BotCommands
 from ..helper.telegram_helper.filters import CustomFilters
 from ..helper.telegram_helper.message_utils import send_message, edit_message
 from ..helper.telegram_helper.button_build import ButtonMaker
 from ..custom.settings_db import (
     set_premium,
-    list_premium_users,
-    get_premium_expire_ts,
+    extend_premium,
+    list_premium_users_with_expiry,
     create_premium_tokens,
     get_premium_token,
     mark_premium_token_redeemed,
@@ -41,16 +45,40 @@ class PaymentRequest:
     amount: int
     screenshot: str | None = None
     utr: str | None = None
-    created_at: int = 0
+    updated_at: int = 0
 
 
 PENDING_PAYMENTS: dict[int, PaymentRequest] = {}
+# /pay sessions with no input for this many seconds are dropped
+PENDING_PAYMENT_TTL = 3600
+
+
+def _prune_pending_payments(now: int):
+    # Entries are kept in updated_at order, so expiry stops at the first live one
+    while PENDING_PAYMENTS:
+        user_id, pending = next(iter(PENDING_PAYMENTS.items()))
+        if now - pending.updated_at < PENDING_PAYMENT_TTL:
+            break
+        del PENDING_PAYMENTS[user_id]
+
+
+async def _pending_payment_filter(_, __, message):
+    return bool(message.from_user and message.from_user.id in PENDING_PAYMENTS)
+
+
+# Only users mid-payment reach pay_input; other DMs stop at the filter
+pending_payment = filters.create(_pending_payment_filter)
 
 
 def _support_button():
     if not Config.SUPPORT_ID:
         return None
-    sid = Config.SUPPORT_ID
+    return _support_keyboard(Config.SUPPORT_ID)
+
+
+# Keyed on SUPPORT_ID so a config reload still gets a fresh button
+@lru_cache(maxsize=4)
+def _support_keyboard(sid: str):
     if not sid.startswith("@"):
         sid = f"@{sid}"
     buttons = ButtonMaker()
@@ -84,6 +112,13 @@ def _payment_keyboard():
     return buttons.build_menu(2)
 
 
+# Static menus, built once instead of on every /pay callback
+_PLAN_KB = _plan_keyboard()
+_PAYMENT_KB = _payment_keyboard()
+
+
+# One entry per (UPI id, plan amount); both are fixed once Config is loaded
+@lru_cache(maxsize=16)
 def _qr_url(upi: str, amount: int) -> str:
     payload = f"upi://pay?pa={upi}&pn=Premium&am={amount}&cu=INR"
     return f"https://api.qrserver.com/v1/create-qr-code/?size=600x600&data={quote_plus(payload)}"
@@ -91,7 +126,7 @@ def _qr_url(upi: str, amount: int) -> str:
 
 async def pay(_, message):
     msg = "⭐ <b>Choose Your Premium Plan</b>"
-    await send_message(message, msg, _plan_keyboard())
+    await send_message(message, msg, _PLAN_KB)
 
 
 async def pay_callback(_, query):
@@ -104,13 +139,16 @@ async def pay_callback(_, query):
         if not plan:
             return await query.answer("Invalid plan", show_alert=True)
         user = query.from_user
+        now = int(time())
+        _prune_pending_payments(now)
+        PENDING_PAYMENTS.pop(user.id, None)
         PENDING_PAYMENTS[user.id] = PaymentRequest(
             user_id=user.id,
             username=f"@{user.username}" if user.username else "unknown",
             plan_key=plan_key,
             label=plan["label"],
             amount=plan["amount"],
-            created_at=int(time()),
+            updated_at=now,
         )
         msg = (
             "<b>Payment Details</b>\n\n"
@@ -124,9 +162,9 @@ async def pay_callback(_, query):
         elif Config.PAYMENT_UPI:
             photo = _qr_url(Config.PAYMENT_UPI, plan["amount"])
         if photo:
-            await send_message(query.message, msg, _payment_keyboard(), photo=photo)
+            await send_message(query.message, msg, _PAYMENT_KB, photo=photo)
         else:
-            await send_message(query.message, msg, _payment_keyboard())
+            await send_message(query.message, msg, _PAYMENT_KB)
         return
     if data == "pay:send_ss":
         return await send_message(query.message, "📤 <b>Send payment screenshot</b>")
@@ -137,9 +175,20 @@ async def pay_callback(_, query):
 async def pay_input(_, message):
     if not message.from_user:
         return
-    pending = PENDING_PAYMENTS.get(message.from_user.id)
+    user_id = message.from_user.id
+    now = int(time())
+    had_session = user_id in PENDING_PAYMENTS
+    _prune_pending_payments(now)
+    pending = PENDING_PAYMENTS.get(user_id)
     if not pending:
-        return
+        if not had_session:
+            return
+        return await send_message(
+            message, "⌛ <b>Payment session expired.</b>\nUse /pay again."
+        )
+    # Move to the end so the dict stays in updated_at order
+    pending.updated_at = now
+    PENDING_PAYMENTS[user_id] = PENDING_PAYMENTS.pop(user_id)
     if message.photo:
         pending.screenshot = message.photo.file_id
         await send_message(message, "✅ <b>Screenshot received</b>")
@@ -153,14 +202,22 @@ async def pay_input(_, message):
             "⏳ <b>Your payment is under verification.</b>\nPlease wait for admin approval.",
         )
         await _notify_admin_payment(pending)
-        PENDING_PAYMENTS.pop(message.from_user.id, None)
+        PENDING_PAYMENTS.pop(user_id, None)
 
 
 async def _notify_admin_payment(pending: PaymentRequest):
-    buttons = ButtonMaker()
-    buttons.data_button("✅ Approve", f"payadmin:approve:{pending.user_id}")
-    buttons.data_button("❌ Decline", f"payadmin:reject:{pending.user_id}")
-    kb = buttons.build_menu(2)
+    kb = InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton(
+                    "✅ Approve", callback_data=f"payadmin:approve:{pending.user_id}"
+                ),
+                InlineKeyboardButton(
+                    "❌ Decline", callback_data=f"payadmin:reject:{pending.user_id}"
+                ),
+            ]
+        ]
+    )
 
     text = (
         "💰 <b>New Premium Payment Request</b>\n\n"
@@ -182,47 +239,46 @@ async def _notify_admin_payment(pending: PaymentRequest):
         except Exception as e:
             LOGGER.error(f"Payment notify failed for {Config.PAYMENT_CHANNEL}: {e}")
 
-    for uid in TgClient.bot.me.id, *():  # no-op, fallback below
-        pass
-    for sudo_id in TgClient.bot.me.id if False else []:
-        pass
     # fallback: send to sudo users
-    for sudo_id in (Config.OWNER_ID, *Config.SUDO_USERS.split()):
-        try:
-            if not sudo_id:
-                continue
-            await TgClient.bot.send_photo(
-                chat_id=int(str(sudo_id).strip()),
+    targets = {
+        int(sid)
+        for sid in (str(Config.OWNER_ID).strip(), *Config.SUDO_USERS.split())
+        if sid.lstrip("-").isdigit()
+    }
+    targets.discard(0)
+    results = await gather(
+        *(
+            TgClient.bot.send_photo(
+                chat_id=chat_id,
                 photo=pending.screenshot,
                 caption=text,
                 reply_markup=kb,
             )
-        except Exception:
-            continue
-
-
-def _add_premium_days(user_id: int, days: int):
-    now = int(time())
-    current = get_premium_expire_ts(user_id)
-    base = max(now, current)
-    expire = base + (days * 86400)
-    set_premium(user_id, True, expire)
-    return expire
+            for chat_id in targets
+        ),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            LOGGER.error(f"Payment notify failed: {result}")
 
 
 async def pay_admin_callback(_, query):
     if not await CustomFilters.sudo(_, query):
         return await query.answer("Unauthorized", show_alert=True)
-    data = query.data.split(":")
-    if len(data) != 3:
+    # payadmin:<action>:<user_id>
+    action, _sep, uid = query.data.removeprefix("payadmin:").partition(":")
+    if not uid.isdigit():
         return
-    action, user_id = data[1], int(data[2])
+    user_id = int(uid)
     pending = PENDING_PAYMENTS.get(user_id)
     if not pending:
         return await query.answer("No pending payment", show_alert=True)
 
     if action == "approve":
-        expire = _add_premium_days(user_id, PAY_PLANS[pending.plan_key]["days"])
+        expire = await sync_to_async(
+            extend_premium, user_id, PAY_PLANS[pending.plan_key]["days"]
+        )
         valid_till = datetime.fromtimestamp(expire).strftime("%Y-%m-%d %H:%M")
         await edit_message(
             query.message,
@@ -251,11 +307,10 @@ async def pay_admin_callback(_, query):
 async def setpremium(_, message):
     if not await CustomFilters.sudo(_, message):
         return await send_message(message, "⛔ Unauthorized")
-    parts = (message.text or "").split(maxsplit=2)
-    if len(parts) < 3:
+    if len(message.command) < 3:
         return await send_message(message, "Usage: /setpremium <user_id> <validity>")
-    user_id = int(parts[1])
-    validity = parts[2].lower()
+    user_id = int(message.command[1])
+    validity = message.command[2].lower()
     days = 0
     if validity.endswith("d"):
         days = int(validity[:-1])
@@ -267,7 +322,7 @@ async def setpremium(_, message):
         days = int(validity[:-1]) * 365
     else:
         return await send_message(message, "Invalid validity. Use 1d/1w/1m/1y.")
-    expire = _add_premium_days(user_id, days)
+    expire = await sync_to_async(extend_premium, user_id, days)
     valid_till = datetime.fromtimestamp(expire).strftime("%Y-%m-%d %H:%M")
     await send_message(message, f"✅ Premium enabled: {user_id}\nValid till: {valid_till}")
 
@@ -275,23 +330,21 @@ async def setpremium(_, message):
 async def delpremium(_, message):
     if not await CustomFilters.sudo(_, message):
         return await send_message(message, "⛔ Unauthorized")
-    parts = (message.text or "").split(maxsplit=1)
-    if len(parts) < 2:
+    if len(message.command) < 2:
         return await send_message(message, "Usage: /delpremium <user_id>")
-    user_id = int(parts[1])
-    set_premium(user_id, False, 0)
+    user_id = int(message.command[1])
+    await sync_to_async(set_premium, user_id, False, 0)
     await send_message(message, f"✅ Premium disabled: {user_id}")
 
 
 async def listpremium(_, message):
     if not await CustomFilters.sudo(_, message):
         return await send_message(message, "⛔ Unauthorized")
-    users = list_premium_users()
+    users = await sync_to_async(list_premium_users_with_expiry)
     if not users:
         return await send_message(message, "No premium users.")
     lines = []
-    for uid in users:
-        exp = get_premium_expire_ts(uid)
+    for uid, exp in users:
         if exp:
             lines.append(f"{uid} (expires {datetime.fromtimestamp(exp)})")
         else:
@@ -302,11 +355,10 @@ async def listpremium(_, message):
 async def generate(_, message):
     if not await CustomFilters.sudo(_, message):
         return await send_message(message, "⛔ Unauthorized")
-    parts = (message.text or "").split(maxsplit=1)
-    if len(parts) < 2 or not parts[1].isdigit():
+    if len(message.command) < 2 or not message.command[1].isdigit():
         return await send_message(message, "Usage: /generate <qty>")
-    qty = int(parts[1])
-    tokens = create_premium_tokens(qty, message.from_user.id)
+    qty = int(message.command[1])
+    tokens = await sync_to_async(create_premium_tokens, qty, message.from_user.id)
     body = "\n".join(tokens)
     text = (
         "✅ Tokens Generated Successfully\n\n"
@@ -322,11 +374,10 @@ async def generate(_, message):
 
 
 async def redeem(_, message):
-    parts = (message.text or "").split(maxsplit=1)
-    if len(parts) < 2:
+    if len(message.command) < 2:
         return await send_message(message, "Usage: /redeem <token>")
-    token = parts[1].strip().upper()
-    token_info = get_premium_token(token)
+    token = message.command[1].upper()
+    token_info = await sync_to_async(get_premium_token, token)
     if not token_info:
         return await send_message(message, "❌ Invalid token.")
     now = int(time())
@@ -338,8 +389,8 @@ async def redeem(_, message):
         return await send_message(
             message, "❌ This token has already been redeemed. Try a new one."
         )
-    mark_premium_token_redeemed(token, message.from_user.id, now)
-    expire = _add_premium_days(message.from_user.id, 1)
+    await sync_to_async(mark_premium_token_redeemed, token, message.from_user.id, now)
+    expire = await sync_to_async(extend_premium, message.from_user.id, 1)
     valid_till = datetime.fromtimestamp(expire).strftime("%Y-%m-%d %H:%M")
     text = (
         "🎉 Premium Activated!\n\n"
@@ -359,6 +410,7 @@ def get_pay_handlers():
         MessageHandler(
             pay_input,
             filters=filters.private
+            & pending_payment
             & ~filters.command(_flatten_commands())
             & CustomFilters.authorized,
         ),